@@ -7,14 +7,23 @@ https://docs.joinmastodon.org/api/
 May also be used for services with Mastodon-compatible APIs, eg Pleroma:
 https://docs-develop.pleroma.social/backend/API/differences_in_mastoapi_responses/
 """
-import itertools
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+import copy
+from datetime import datetime, timezone
+import functools
 import logging
 import re
+import threading
+import time
 import urllib.parse
 
+from cachetools import TTLCache
+try:
+  import orjson
+except ImportError:
+  orjson = None
 from oauth_dropins.webutil import util
-from oauth_dropins.webutil.testutil import requests_response
-from oauth_dropins.webutil.util import json_dumps, json_loads
 from requests import HTTPError, JSONDecodeError, RequestException
 
 from . import as1
@@ -56,6 +65,40 @@ MEDIA_TYPES = {
 # https://github.com/tootsuite/mastodon/commit/5f511324b6#diff-11783d64d04391768226f7d45a610898R40
 MAX_MEDIA = 4
 
+# max concurrent HTTP requests in create_many
+MAX_CREATE_WORKERS = 8
+
+# capped exponential backoff delays, in seconds, between retries of rate
+# limited API calls. https://docs.joinmastodon.org/api/rate-limits/
+RATE_LIMIT_BACKOFF_SECS = (1, 2, 4, 8)
+
+# alias allows unit tests to mock this function
+sleep_fn = time.sleep
+
+BASE_OBJECT_CACHE_TIME = 60  # 1 minute expiration, in seconds
+base_object_cache = TTLCache(1024, BASE_OBJECT_CACHE_TIME)
+base_object_cache_lock = threading.RLock()
+
+# error templates for _create when it can't find the post that a like or
+# repost operates on, keyed by TYPE_LABELS key. built once at import so the
+# error paths just format in the instance's labels.
+NOT_FOUND_PLAIN = 'Could not find a {post_label} to {label}.'
+NOT_FOUND_HTML = {
+  'like': ('Could not find a {post_label} to <a href="http://indiewebcamp.com/like">{label}</a>. '
+           'Check that your post has the right <a href="http://indiewebcamp.com/like">u-like-of link</a>.'),
+  'repost': ('Could not find a {post_label} to <a href="http://indiewebcamp.com/repost">{label}</a>. '
+             'Check that your post has the right <a href="http://indiewebcamp.com/repost">repost-of</a> link.'),
+}
+
+# preview description templates for _create, keyed by TYPE_LABELS key,
+# also built once at import
+PREVIEW_DESCRIPTIONS = {
+  'like': '<span class="verb">{label}</span> <a href="{url}">this {post_label}</a>: {embed}',
+  'repost': '<span class="verb">{label}</span> <a href="{url}">this {post_label}</a>: {embed}',
+  'comment': '<span class="verb">{label}</span> to <a href="{url}">this {post_label}</a>: {embed}',
+  'post': '<span class="verb">{label}</span>:',
+}
+
 # copied from Mastodon's source on 2019-10-21, then revised the lookbehind
 # https://github.com/tootsuite/mastodon/blob/6bee7b820dcde6d487e93b8699d4aab3e49bedc4/app/models/account.rb#L52-L53
 USERNAME_RE = re.compile(r'[a-z0-9_]+([a-z0-9_\.-]+[a-z0-9_]+)?', re.IGNORECASE)
@@ -63,6 +106,87 @@ MENTION_RE  = re.compile(r'(?<![\/\w])@((' + USERNAME_RE.pattern +
                          r')(?:@[a-z0-9\.\-]+[a-z0-9]+)?)', re.IGNORECASE)
 
 
+@functools.lru_cache(maxsize=1024)
+def _linkify(content):
+  """Linkifies a status, caching results for identical content strings.
+
+  linkify runs a battery of regexes over the text, and preview-then-publish
+  flows feed it the exact same string twice. Memory stays bounded since
+  content has already been truncated to the instance's toot length.
+
+  Args:
+    content (str)
+
+  Returns:
+    str: linkified content
+  """
+  return util.linkify(content, pretty=True, skip_bare_cc_tlds=True)
+
+
+def _parse_json(resp):
+  """Parses a response body as JSON, from the raw bytes.
+
+  Args:
+    resp: :class:`requests.Response`
+
+  Returns:
+    dict or list: decoded JSON
+  """
+  return orjson.loads(resp.content) if orjson else resp.json()
+
+
+class _RateLimiter:
+  """Paces API calls based on Mastodon's rate limit response headers.
+
+  https://docs.joinmastodon.org/api/rate-limits/
+  """
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.remaining = None
+    self.reset = None
+
+  def update(self, headers):
+    """Records the ``X-RateLimit-*`` headers from an API response.
+
+    Args:
+      headers: mapping, HTTP response headers
+    """
+    remaining = headers.get('X-RateLimit-Remaining')
+    reset = headers.get('X-RateLimit-Reset')
+    with self.lock:
+      if util.is_int(remaining):
+        self.remaining = int(remaining)
+      if reset:
+        try:
+          reset = util.parse_iso8601(reset)
+        except ValueError:
+          return
+        if not reset.tzinfo:
+          reset = reset.replace(tzinfo=timezone.utc)
+        self.reset = reset
+
+  def wait(self):
+    """Sleeps until the rate limit window resets, if it's exhausted."""
+    with self.lock:
+      remaining = self.remaining
+      reset = self.reset
+
+    if remaining is not None and remaining <= 0 and reset:
+      delay = (reset - datetime.now(timezone.utc)).total_seconds()
+      if delay > 0:
+        logger.info(f'Rate limit exhausted; sleeping {delay}s, until {reset}')
+        sleep_fn(delay)
+
+
+# per-instance rate limiters, keyed by instance base URL
+_rate_limiters = defaultdict(_RateLimiter)
+
+# single-flight guard for concurrent identical GETs, eg from create_many
+# threads resolving the same base object. maps request key to Future.
+_inflight_gets = {}
+_inflight_gets_lock = threading.Lock()
+
+
 class Mastodon(source.Source):
   """Mastodon source class. See file docstring and Source class for details.
 
@@ -85,7 +209,7 @@ class Mastodon(source.Source):
   TRUNCATE_URL_LENGTH = 23
 
   def __init__(self, instance, access_token, user_id=None,
-               truncate_text_length=None):
+               truncate_text_length=None, session=None):
     """Constructor.
 
     If ``user_id`` is not provided, it will be fetched via the API.
@@ -97,6 +221,9 @@ class Mastodon(source.Source):
       access_token (str): optional OAuth access token
       truncate_text_length (int): optional character limit for toots, overrides
         the default of 500
+      session (requests.Session): optional, if provided all API calls are made
+        through it, so that they reuse one kept-alive connection instead of
+        paying a new TCP + TLS handshake per request
     """
     assert instance
     self.instance = self.BASE_URL = instance
@@ -106,6 +233,17 @@ class Mastodon(source.Source):
       truncate_text_length if truncate_text_length is not None
       else DEFAULT_TRUNCATE_TEXT_LENGTH)
     self.DOMAIN = util.domain_from_link(instance)
+    self.session = session
+    # all API paths are absolute, so resolve the base URL once instead of
+    # paying urljoin's full parse + reassemble on every request
+    self._api_base = urllib.parse.urljoin(instance, '/')
+    # hashtag replacement template for _create, built once per instance.
+    # if we ever need to revise the hashtag regexp, we could use Mastodon's:
+    # https://github.com/tootsuite/mastodon/blob/915f3712ae7ae44c0cbe50c9694c25e3ee87a540/app/models/tag.rb#L28-L30
+    tags_url = urllib.parse.urljoin(instance, '/tags')
+    self._hashtag_repl = r'\1<a href="%s/\2">#\2</a>' % tags_url
+    # the Authorization header value never changes, so build it once
+    self._auth_header = 'Bearer ' + access_token
 
     if user_id:
       self.user_id = user_id
@@ -117,7 +255,39 @@ class Mastodon(source.Source):
     return urllib.parse.urljoin(self.instance, '@' + username)
 
   def _get(self, *args, **kwargs):
-    return self._api(util.requests_get, *args, **kwargs)
+    params = kwargs.get('params')
+    # the key must cover everything that affects the response: the access
+    # token scopes user-specific endpoints, eg verify_credentials and home
+    # timeline, and return_json changes the return type
+    key = (self.instance, self.access_token, kwargs.get('return_json', True),
+           args, tuple(sorted(params.items())) if params else None)
+    try:
+      hash(key)
+    except TypeError:  # eg a list-valued query param
+      return self._api(util.requests_get, *args, **kwargs)
+
+    # single-flight: if another thread is already fetching this exact request,
+    # wait for its result instead of issuing a duplicate
+    with _inflight_gets_lock:
+      future = _inflight_gets.get(key)
+      owner = future is None
+      if owner:
+        future = Future()
+        _inflight_gets[key] = future
+
+    if not owner:
+      return future.result()
+
+    try:
+      result = self._api(util.requests_get, *args, **kwargs)
+      future.set_result(result)
+      return result
+    except BaseException as e:
+      future.set_exception(e)
+      raise
+    finally:
+      with _inflight_gets_lock:
+        _inflight_gets.pop(key, None)
 
   def _post(self, *args, **kwargs):
     return self._api(util.requests_post, *args, **kwargs)
@@ -127,10 +297,28 @@ class Mastodon(source.Source):
 
   def _api(self, fn, path, return_json=True, *args, **kwargs):
     headers = kwargs.setdefault('headers', {})
-    headers['Authorization'] = 'Bearer ' + self.access_token
+    headers['Authorization'] = self._auth_header
+    kwargs.setdefault('session', self.session)
+
+    url = (path if path.startswith('http')
+           else self._api_base + path.lstrip('/'))
+    limiter = _rate_limiters[self.instance]
+
+    # don't retry requests whose body is a read-once stream, eg media uploads
+    # posting files={'file': resp.raw}: the first attempt consumes the stream,
+    # and requests doesn't rewind file objects, so a retry would silently
+    # re-send an empty body. let the 429 surface instead.
+    retryable = not kwargs.get('files') and not hasattr(kwargs.get('data'), 'read')
+
+    for backoff in (RATE_LIMIT_BACKOFF_SECS if retryable else ()) + (None,):
+      limiter.wait()
+      resp = fn(url, *args, **kwargs)
+      limiter.update(resp.headers)
+      if resp.status_code != 429 or backoff is None:
+        break
+      logger.info(f'Rate limited (HTTP 429); retrying in {backoff}s')
+      sleep_fn(backoff)
 
-    url = urllib.parse.urljoin(self.instance, path)
-    resp = fn(url, *args, **kwargs)
     try:
       resp.raise_for_status()
     except BaseException as e:
@@ -143,14 +331,31 @@ class Mastodon(source.Source):
     if fn == util.requests_delete:
       return {}
 
+    return self._parse_body(resp)
+
+  @staticmethod
+  def _parse_body(resp):
+    """Parses an API response body as JSON and checks it for errors.
+
+    Args:
+      resp: :class:`requests.Response`
+
+    Returns:
+      dict or list: decoded JSON body
+
+    Raises:
+      requests.HTTPError: if the body isn't valid JSON or contains an error
+    """
     content_type = resp.headers.get('Content-Type', '')
     if content_type.split(';')[0] != 'application/json':
       # Truth Social returns text/plain;charset=UTF-8
       logging.warning(f'Content-Type {content_type} is not application/json!')
 
     try:
-      body = resp.json()
-    except JSONDecodeError as e:
+      # parse the raw bytes; orjson is significantly faster than stdlib json
+      # on big payloads, eg timelines, and skips resp.text's decode round trip
+      body = _parse_json(resp)
+    except (JSONDecodeError, ValueError) as e:
       resp.status_code = 502
       raise HTTPError(e, response=resp)
 
@@ -161,6 +366,43 @@ class Mastodon(source.Source):
 
     return body
 
+  def _get_paginated(self, path, params=None, limit=None):
+    """Fetches an API endpoint, following ``Link: rel=next`` pagination.
+
+    https://docs.joinmastodon.org/api/guidelines/#pagination
+
+    Args:
+      path (str): API path
+      params (dict): query params for the first request
+      limit (int): total number of results wanted. If None or 0, only the
+        first page is fetched.
+
+    Returns:
+      list of dict: decoded JSON entities
+    """
+    url = path
+    results = []
+
+    while True:
+      resp = self._get(url, params=params, return_json=False)
+      page = self._parse_body(resp)
+      if not isinstance(page, list):
+        return page
+
+      results.extend(page)
+      if not limit or len(results) >= limit:
+        break
+
+      url = resp.links.get('next', {}).get('url')
+      if not url:
+        break
+      # next page URLs already include the query params
+      params = None
+
+    # the last page may overshoot, eg a partial first page followed by a full
+    # second page, so re-cap to the requested total
+    return results[:limit] if limit else results
+
   @classmethod
   def embed_post(cls, obj):
     """Returns the HTML for embedding a toot.
@@ -204,10 +446,12 @@ class Mastodon(source.Source):
     if count:
       params['limit'] = count + start_index
 
+    limit = count + start_index if count else None
+
     if activity_id:
       statuses = [self._get(API_STATUS % activity_id)]
     elif group_id in (None, source.FRIENDS):
-      statuses = self._get(API_TIMELINE, params=params)
+      statuses = self._get_paginated(API_TIMELINE, params=params, limit=limit)
     elif group_id == source.SEARCH:
       if not search_query:
         raise ValueError('search requires search_query parameter')
@@ -218,7 +462,8 @@ class Mastodon(source.Source):
         **params,
       }).get('statuses', [])
     else:  # eg group_id SELF
-      statuses = self._get(API_ACCOUNT_STATUSES % user_id, params=params)
+      statuses = self._get_paginated(API_ACCOUNT_STATUSES % user_id,
+                                     params=params, limit=limit)
 
     activities = []
 
@@ -226,11 +471,15 @@ class Mastodon(source.Source):
       # for convenience, throwaway object just for this method
       cache = {}
 
+    # bind the conversion methods once, outside the per-status hot loop
+    to_activity = self.status_to_as1_activity
+    postprocess = self.postprocess_activity
+
     # fetch extras if necessary
     for status in statuses[start_index:]:
       if not include_shares and status.get('reblog'):
         continue
-      activity = self.postprocess_activity(self.status_to_as1_activity(status))
+      activity = postprocess(to_activity(status))
       activities.append(activity)
 
       id = status.get('id')
@@ -242,8 +491,7 @@ class Mastodon(source.Source):
       if fetch_replies and count and count != cache.get('AMRE ' + id):
         context = self._get(API_CONTEXT % id)
         obj['replies'] = {
-          'items': [self.status_to_as1_activity(reply)
-                    for reply in context.get('descendants', [])]
+          'items': list(map(to_activity, context.get('descendants', []))),
         }
         cache['AMRE ' + id] = count
 
@@ -267,11 +515,12 @@ class Mastodon(source.Source):
       notifs = self._get(API_NOTIFICATIONS, params={
         'exclude_types[]': ['follow', 'favourite', 'reblog'],
       })
-      activities.extend(self.status_to_as1_activity(n['status']) for n in notifs
+      activities.extend(to_activity(n['status']) for n in notifs
                         if n.get('status') and n.get('type') == 'mention')
 
-    resp = self.make_activities_base_response(util.trim_nulls(activities))
-    return resp
+    # pass an iterator so trim_nulls streams trimmed activities straight into
+    # the response instead of materializing a second full list
+    return self.make_activities_base_response(util.trim_nulls(iter(activities)))
 
   def get_actor(self, user_id=None):
     """Fetches and returns an account.
@@ -559,6 +808,39 @@ class Mastodon(source.Source):
     return self._create(obj, preview=False, include_link=include_link,
                         ignore_formatting=ignore_formatting)
 
+  def create_many(self, objs, include_link=source.OMIT_LINK,
+                  ignore_formatting=False, max_workers=None):
+    """Creates multiple statuses, replies, boosts, or favorites concurrently.
+
+    Issues the API requests in parallel on a thread pool, so total latency is
+    closer to the slowest single request than to the sum of all of them.
+
+    Mastodon has no batch publish endpoint, so each object still becomes its
+    own POST, but the whole per-object pipeline - base object resolution,
+    media upload, publish - overlaps across objects. Requests are paced by
+    the per-instance rate limiter, and concurrent duplicate lookups, eg two
+    replies resolving the same parent, are coalesced.
+
+    Args:
+      objs (sequence of dict): ActivityStreams objects
+      include_link (str)
+      ignore_formatting (bool)
+      max_workers (int): optional limit on concurrent requests, defaults to
+        :const:`MAX_CREATE_WORKERS`
+
+    Returns:
+      list of CreationResult: one per input object, in the same order
+    """
+    objs = list(objs)
+    if not objs:
+      return []
+
+    create = lambda obj: self.create(obj, include_link=include_link,
+                                     ignore_formatting=ignore_formatting)
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers or MAX_CREATE_WORKERS, len(objs))) as pool:
+      return list(pool.map(create, objs))
+
   def preview_create(self, obj, include_link=source.OMIT_LINK,
                      ignore_formatting=False):
     """Preview creating a status (aka toot), reply, boost (aka reblog), or favorite.
@@ -596,8 +878,12 @@ class Mastodon(source.Source):
       created object.
     """
     assert preview in (False, True)
+    # hoist the repeated field and label lookups; this function is on the hot
+    # publish path and reads most of these several times across its branches
     type = obj.get('objectType')
     verb = obj.get('verb')
+    obj_url = obj.get('url')
+    labels = self.TYPE_LABELS
 
     base_obj = self.base_object(obj)
     base_id = base_obj.get('id')
@@ -635,7 +921,7 @@ class Mastodon(source.Source):
     # truncate and ellipsize content if necessary
     # TODO: don't count domains in remote mentions.
     # https://docs.joinmastodon.org/user/posting/#text
-    content = self.truncate(content, obj.get('url'), include_link, type)
+    content = self.truncate(content, obj_url, include_link, type)
 
     # linkify user mentions
     def linkify_mention(match):
@@ -648,25 +934,18 @@ class Mastodon(source.Source):
     preview_content = MENTION_RE.sub(linkify_mention, content)
 
     # linkify (defaults to twitter's behavior)
-    preview_content = util.linkify(preview_content, pretty=True, skip_bare_cc_tlds=True)
-    tags_url = urllib.parse.urljoin(self.instance, '/tags')
-    # if we ever need to revise this hashtag regexp, we could use Mastodon's:
-    # https://github.com/tootsuite/mastodon/blob/915f3712ae7ae44c0cbe50c9694c25e3ee87a540/app/models/tag.rb#L28-L30
-    preview_content = as1.HASHTAG_RE.sub(r'\1<a href="%s/\2">#\2</a>' % tags_url,
-                                         preview_content)
+    preview_content = _linkify(preview_content)
+    preview_content = as1.HASHTAG_RE.sub(self._hashtag_repl, preview_content)
 
-    post_label = f"{self.NAME} {self.TYPE_LABELS['post']}"
+    post_label = f"{self.NAME} {labels['post']}"
 
     # switch on activity type
     if type == 'activity' and verb in ('like', 'favorite'):
       if not base_url:
-        return source.creation_result(
-          abort=True,
-          error_plain=f"Could not find a {post_label} to {self.TYPE_LABELS['like']}.",
-          error_html=f"Could not find a {post_label} to <a href=\"http://indiewebcamp.com/like\">{self.TYPE_LABELS['like']}</a>. Check that your post has the right <a href=\"http://indiewebcamp.com/like\">u-like-of link</a>.")
+        return self._not_found_error('like')
 
       if preview:
-        preview_description += f"<span class=\"verb\">{self.TYPE_LABELS['like']}</span> <a href=\"{base_url}\">this {self.TYPE_LABELS['post']}</a>: {self.embed_post(base_obj)}"
+        preview_description += self._preview_description('like', base_url, base_obj)
         return source.creation_result(description=preview_description)
       else:
         resp = self._post(API_FAVORITE % base_id)
@@ -675,13 +954,10 @@ class Mastodon(source.Source):
 
     elif type == 'activity' and verb == 'share':
       if not base_url:
-        return source.creation_result(
-          abort=True,
-          error_plain=f"Could not find a {post_label} to {self.TYPE_LABELS['repost']}.",
-          error_html=f"Could not find a {post_label} to <a href=\"http://indiewebcamp.com/repost\">{self.TYPE_LABELS['repost']}</a>. Check that your post has the right <a href=\"http://indiewebcamp.com/repost\">repost-of</a> link.")
+        return self._not_found_error('repost')
 
       if preview:
-          preview_description += f"<span class=\"verb\">{self.TYPE_LABELS['repost']}</span> <a href=\"{base_url}\">this {self.TYPE_LABELS['post']}</a>: {self.embed_post(base_obj)}"
+          preview_description += self._preview_description('repost', base_url, base_obj)
           return source.creation_result(description=preview_description)
       else:
         resp = self._post(API_REBLOG % base_id)
@@ -692,10 +968,10 @@ class Mastodon(source.Source):
       data = {'status': content}
 
       if is_reply and base_url:
-        preview_description += f"<span class=\"verb\">{self.TYPE_LABELS['comment']}</span> to <a href=\"{base_url}\">this {self.TYPE_LABELS['post']}</a>: {self.embed_post(base_obj)}"
+        preview_description += self._preview_description('comment', base_url, base_obj)
         data['in_reply_to_id'] = base_id
       else:
-        preview_description += f"<span class=\"verb\">{self.TYPE_LABELS['post']}</span>:"
+        preview_description += self._preview_description('post')
 
       num_media = len(videos) + len(images)
       if num_media > MAX_MEDIA:
@@ -733,6 +1009,39 @@ class Mastodon(source.Source):
 
     return source.creation_result(resp)
 
+  def _preview_description(self, kind, base_url=None, base_obj=None):
+    """Renders the preview description snippet for a publish action.
+
+    Args:
+      kind (str): a :const:`PREVIEW_DESCRIPTIONS` key
+      base_url (str): URL of the post being operated on, if any
+      base_obj (dict): AS1 object of the post being operated on, if any
+
+    Returns:
+      str: HTML snippet
+    """
+    labels = self.TYPE_LABELS
+    return PREVIEW_DESCRIPTIONS[kind].format(
+      label=labels[kind], post_label=labels['post'], url=base_url,
+      embed=self.embed_post(base_obj) if base_obj else '')
+
+  def _not_found_error(self, kind):
+    """Returns an error result for a missing like or repost base post.
+
+    Args:
+      kind (str): ``like`` or ``repost``, a :const:`NOT_FOUND_HTML` key
+
+    Returns:
+      CreationResult:
+    """
+    labels = self.TYPE_LABELS
+    post_label = f"{self.NAME} {labels['post']}"
+    label = labels[kind]
+    return source.creation_result(
+      abort=True,
+      error_plain=NOT_FOUND_PLAIN.format(post_label=post_label, label=label),
+      error_html=NOT_FOUND_HTML[kind].format(post_label=post_label, label=label))
+
   def base_object(self, obj):
     """Returns the "base" Mastodon object that an object operates on.
 
@@ -764,11 +1073,24 @@ class Mastodon(source.Source):
         if url.startswith(self.instance):
           return self._postprocess_base_object(base)
 
-        # nope; try mastodon's search API
+        # nope; try mastodon's search API. these lookups are cached briefly,
+        # since the same target URL is often resolved several times in a row,
+        # eg preview then publish.
+        cache_key = (self.instance, url)
+        with base_object_cache_lock:
+          cached = base_object_cache.get(cache_key)
+        if cached is not None:
+          if not cached:
+            # cached negative result; we recently failed to resolve this URL
+            continue
+          return self._postprocess_base_object(copy.deepcopy(cached))
+
         try:
           results = self._get(API_SEARCH, params={'q': url, 'resolve': True})
         except RequestException:
           logger.info(f"{field} URL {url} doesn't look like Mastodon:")
+          with base_object_cache_lock:
+            base_object_cache[cache_key] = {}
           continue
 
         for status in results.get('statuses', []):
@@ -776,8 +1098,15 @@ class Mastodon(source.Source):
             # found it!
             base = self.status_to_object(status)
             base['id'] = status['id']
+            with base_object_cache_lock:
+              base_object_cache[cache_key] = copy.deepcopy(base)
             return self._postprocess_base_object(base)
 
+        # not found. remember that too, so that retries, which bridging
+        # systems commonly do, don't repeat the search
+        with base_object_cache_lock:
+          base_object_cache[cache_key] = {}
+
     return {}
 
   def status_url(self, id):
@@ -811,7 +1140,10 @@ class Mastodon(source.Source):
         data['description'] = util.ellipsize(alt, chars=MAX_ALT_LENGTH)
 
       # TODO: mime type check?
-      with util.requests_get(url, stream=True) as fetch:
+      # reuse our session's connection pool, if we have one, since media for
+      # consecutive posts often comes from the same host
+      kwargs = {'session': self.session} if self.session else {}
+      with util.requests_get(url, stream=True, **kwargs) as fetch:
         fetch.raise_for_status()
         upload = self._post(API_MEDIA, files={'file': fetch.raw}, data=data)
 
@@ -861,7 +1193,7 @@ class Mastodon(source.Source):
     url = API_BLOCKS
     while True:
       resp = self._get(url, return_json=False)
-      ids.extend(util.trim_nulls([rel.get('id') for rel in resp.json()]))
+      ids.extend(util.trim_nulls([rel.get('id') for rel in _parse_json(resp)]))
       url = resp.links.get('next', {}).get('url')
       if not url:
         break
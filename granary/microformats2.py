@@ -4,18 +4,17 @@ Microformats2 specs: http://microformats.org/wiki/microformats2
 
 ActivityStreams 1 specs: http://activitystrea.ms/specs/
 """
-from collections import defaultdict
+from collections import defaultdict, deque
 import copy
 import html
 import itertools
 import logging
 import urllib.parse
-import string
 import re
-import xml.sax.saxutils
 
 import dateutil.parser
 import humanfriendly
+import jinja2
 import mf2util
 from oauth_dropins.webutil import util
 from oauth_dropins.webutil.util import (
@@ -24,6 +23,7 @@ from oauth_dropins.webutil.util import (
   get_list,
   get_url,
   get_urls,
+  json_dumps,
   uniquify,
 )
 
@@ -32,37 +32,43 @@ from . import source
 
 logger = logging.getLogger(__name__)
 
-HENTRY = string.Template("""\
-<article class="$types">
-  <span class="p-uid">$uid</span>
-  $summary
-  $published
-  $updated
-$author
-  $linked_name
-  <div class="$content_classes">
-  $invitees
-  $content
+# single shared environment so the templates below share one compiled-template
+# infrastructure (filters, globals, code generator) instead of each
+# jinja2.Template() call building its own implicit environment
+JINJA_ENV = jinja2.Environment(keep_trailing_newline=True)
+
+# compiled once at import so that rendering skips template parsing per entry
+HENTRY = JINJA_ENV.from_string("""\
+<article class="{{ types }}">
+  <span class="p-uid">{{ uid }}</span>
+  {{ summary }}
+  {{ published }}
+  {{ updated }}
+{{ author }}
+  {{ linked_name }}
+  <div class="{{ content_classes }}">
+  {{ invitees }}
+  {{ content }}
   </div>
-$attachments
-$sizes
-$event_times
-$location
-$categories
-$links
-$children
-$comments
+{{ attachments }}
+{{ sizes }}
+{{ event_times }}
+{{ location }}
+{{ categories }}
+{{ links }}
+{{ children }}
+{{ comments }}
 </article>
 """)
-HCARD = string.Template("""\
-  <span class="$types">
-    $ids
-    $linked_name
-    $nicknames
-    $photos
+HCARD = JINJA_ENV.from_string("""\
+  <span class="{{ types }}">
+    {{ ids }}
+    {{ linked_name }}
+    {{ nicknames }}
+    {{ photos }}
   </span>
 """)
-LINK = string.Template('  <a class="u-$cls" href="$url"></a>')
+LINK = '  <a class="u-{cls}" href="{url}"></a>'
 AS_TO_MF2_TYPE = {
   'application': ['h-card'],
   'event': ['h-event'],
@@ -100,6 +106,65 @@ MF2_TO_AS_TYPE_VERB = {
 }
 # ISO 6709 location string. http://en.wikipedia.org/wiki/ISO_6709
 ISO_6709_RE = re.compile(r'^([-+][0-9.]+)([-+][0-9.]+).*/$')
+# GitHub repo or issues list URL, eg https://github.com/snarfed/granary/issues
+GITHUB_REPO_ISSUES_RE = re.compile(r'^https?://github.com/[^/]+/[^/]+(/issues)?/?$')
+# absolute URL, ie one with a netloc, optionally scheme-relative
+ABS_URL_RE = re.compile(r'^(?:[a-zA-Z][a-zA-Z0-9+.-]*:)?//[^/\s]')
+# objects with at most these keys are bare references, eg a like of just a URL.
+# allocated once here instead of per compared object.
+ID_ONLY_KEYS = frozenset(('id', 'url', 'objectType'))
+BARE_REF_KEYS = frozenset(('url', 'objectType'))
+# escapes for double-quoted HTML attribute values. single-pass translate table
+# instead of xml.sax.saxutils.quoteattr's Python-level replace() loop.
+ATTR_ESCAPES = str.maketrans({
+  '&': '&amp;',
+  '<': '&lt;',
+  '>': '&gt;',
+  '"': '&quot;',
+  '\n': '&#10;',
+  '\r': '&#13;',
+  '\t': '&#9;',
+})
+
+
+def _quoteattr(val):
+  """Escapes and double-quotes a string for use as an HTML attribute value."""
+  return f'"{val.translate(ATTR_ESCAPES)}"'
+
+
+def _find_first_entry(parsed, types):
+  """Finds the first interesting item in a parsed mf2 document.
+
+  Breadth-first search, like :func:`mf2util.find_first_entry`, but avoids the
+  per-item linear type scan there: ``types`` becomes a :class:`frozenset` and
+  each item is checked with a single C-level ``isdisjoint``.
+
+  Args:
+    parsed (dict): parsed JSON microformats2 document
+    types (sequence of str): item types to look for, eg ``['h-feed']``
+
+  Returns:
+    dict: the first matching item, or None
+  """
+  types = frozenset(types)
+  queue = deque(parsed.get('items', []))
+  popleft = queue.popleft
+  extend = queue.extend
+
+  while queue:
+    item = popleft()
+    if not types.isdisjoint(item.get('type', [])):
+      return item
+    extend(item.get('children', []))
+
+
+def _is_absolute(url):
+  """Filters out relative and invalid URLs (mf2py gives absolute urls).
+
+  A single pre-compiled regex match instead of :func:`urllib.parse.urlparse`,
+  which walks the string in Python and allocates a six-tuple per call.
+  """
+  return ABS_URL_RE.match(url)
 
 
 def get_string_urls(objs):
@@ -118,15 +183,18 @@ def get_string_urls(objs):
   if not objs:
     return []
 
+  # iterative depth-first walk instead of recursing into each embedded object,
+  # so deeply nested h-cites don't allocate a frame per level or risk hitting
+  # the recursion limit. reversed() preserves the original document order.
   urls = []
-  for item in objs:
+  stack = list(reversed(objs))
+  while stack:
+    item = stack.pop()
     if isinstance(item, str):
       urls.append(item)
-    else:
-      itemtype = [x for x in item.get('type', []) if x.startswith('h-')]
-      if itemtype:
-        item = item.get('properties') or item
-        urls.extend(get_string_urls(item.get('url', [])))
+    elif any(x.startswith('h-') for x in item.get('type', [])):
+      props = item.get('properties') or item
+      stack.extend(reversed(props.get('url', [])))
 
   return urls
 
@@ -208,13 +276,34 @@ def from_as1(obj, trim_nulls=True, entry_class='h-entry',
   if not obj or not isinstance(obj, dict):
     return {}
 
-  obj_type = as1.object_type(obj) or default_object_type
+  # fast path for bare references, eg an author or location that's just a URL.
+  # the general construction below would build, then trim away, dozens of empty
+  # properties to arrive at this same result. a non-string entry_class takes
+  # precedence over AS_TO_MF2_TYPE below, so only a string one can take this path.
+  if (trim_nulls and isinstance(entry_class, str)
+      and obj.keys() <= BARE_REF_KEYS):
+    url = obj.get('url')
+    if url is None or isinstance(url, str):
+      mf2_type = AS_TO_MF2_TYPE.get(obj.get('objectType') or default_object_type)
+      if mf2_type:
+        ret = {'type': list(mf2_type)}
+        if url:
+          ret['properties'] = {'url': [url]}
+        return ret
+
+  # localize the hot callables; each is hit many times per conversion
+  to_json = object_to_json
+  object_type = as1.object_type
+  get_object = as1.get_object
+  get_objects = as1.get_objects
+
+  obj_type = object_type(obj) or default_object_type
   # if the activity type is a post, then it's really just a conduit
   # for the object. for other verbs, the activity itself is the
   # interesting thing
   if obj_type == 'post':
-    primary = as1.get_object(obj, 'object')
-    obj_type = as1.object_type(primary) or default_object_type
+    primary = get_object(obj, 'object')
+    obj_type = object_type(primary) or default_object_type
   else:
     primary = obj
 
@@ -224,15 +313,15 @@ def from_as1(obj, trim_nulls=True, entry_class='h-entry',
   note = primary.get('note')
   author = obj.get('author', obj.get('actor', {}))
 
-  in_reply_tos = as1.get_objects(obj, 'inReplyTo')
+  in_reply_tos = get_objects(obj, 'inReplyTo')
   if not in_reply_tos:
     context = obj.get('context')
     if context and isinstance(context, dict):
-      in_reply_tos = as1.get_objects(context, 'inReplyTo')
+      in_reply_tos = get_objects(context, 'inReplyTo')
 
   is_rsvp = obj_type in ('rsvp-yes', 'rsvp-no', 'rsvp-maybe')
   if is_rsvp or obj_type == 'react':
-    in_reply_tos.extend(as1.get_objects(obj))
+    in_reply_tos.extend(get_objects(obj))
 
   in_reply_tos = list(util.trim_nulls(itertools.chain.from_iterable(
     [o.get('id'), o.get('url')] for o in in_reply_tos)))
@@ -262,12 +351,14 @@ def from_as1(obj, trim_nulls=True, entry_class='h-entry',
   size = stream.get('size')
   sizes = [str(size)] if size else []
 
+  location = get_object(primary, 'location')
+
   # attachments to children
   children = []
   for att_type, atts in attachments.items():
     mf2_types = AS_ATTACHMENT_TO_MF2_TYPE.get(att_type)
     if mf2_types:
-      children.extend(object_to_json(a, trim_nulls=False, entry_class=mf2_types)
+      children.extend(to_json(a, trim_nulls=False, entry_class=mf2_types)
                       for a in atts if 'startIndex' not in a)
 
   # construct mf2!
@@ -295,12 +386,15 @@ def from_as1(obj, trim_nulls=True, entry_class='h-entry',
       'updated': [maybe_normalize_iso8601(
         obj.get('updated') or primary.get('updated'))],
       'in-reply-to': in_reply_tos,
-      'author': [object_to_json(
-        author, trim_nulls=False, default_object_type='person')],
-      'location': [object_to_json(as1.get_object(primary, 'location'),
-                                  trim_nulls=False, default_object_type='place')],
-      'comment': [object_to_json(c, trim_nulls=False, entry_class='h-cite')
-                  for c in as1.get_object(obj, 'replies').get('items', [])],
+      # skip the recursive conversions entirely when there's nothing to convert
+      'author': [to_json(author, trim_nulls=False,
+                                default_object_type='person')
+                 if author else {}],
+      'location': [to_json(location, trim_nulls=False,
+                                  default_object_type='place')
+                   if location else {}],
+      'comment': [to_json(c, trim_nulls=False, entry_class='h-cite')
+                  for c in get_object(obj, 'replies').get('items', [])],
       'start': [primary.get('startTime')],
       'end': [primary.get('endTime')],
     },
@@ -321,9 +415,9 @@ def from_as1(obj, trim_nulls=True, entry_class='h-entry',
   # photos, including alt text
   photo_urls = set()
   ret['properties']['photo'] = []
-  for img in as1.get_objects(attachments, 'image') + as1.get_objects(primary, 'image'):
+  for img in get_objects(attachments, 'image') + get_objects(primary, 'image'):
     if img.get('image'):
-      img = as1.get_object(img, 'image')
+      img = get_object(img, 'image')
     url = get_url(img) or img.get('id')
     if url and url not in photo_urls:
       photo_urls.add(url)
@@ -334,7 +428,7 @@ def from_as1(obj, trim_nulls=True, entry_class='h-entry',
   if obj_type == 'tag':
     ret['properties']['tag-of'] = util.get_urls(obj, 'target')
 
-  inner_obj = as1.get_object(obj)
+  inner_obj = get_object(obj)
   tags = obj.get('tags', []) or inner_obj.get('tags', [])
   if not tags and obj_type == 'tag':
     tags = util.get_list(obj, 'object')
@@ -342,7 +436,7 @@ def from_as1(obj, trim_nulls=True, entry_class='h-entry',
   for tag in tags:
     if tag.get('objectType') in as1.ACTOR_TYPES:
       ret['properties']['category'].append(
-        object_to_json(tag, entry_class='u-category h-card'))
+        to_json(tag, entry_class='u-category h-card'))
     elif tag.get('objectType') == 'hashtag' or obj_type == 'tag':
       name = tag.get('displayName')
       if name:
@@ -352,11 +446,16 @@ def from_as1(obj, trim_nulls=True, entry_class='h-entry',
   if is_rsvp:
     ret['properties']['rsvp'] = [obj_type[len('rsvp-'):]]
   elif obj_type == 'invite':
-    invitee = object_to_json(inner_obj, trim_nulls=False,
+    invitee = to_json(inner_obj, trim_nulls=False,
                              default_object_type='person')
     ret['properties']['invitee'] = [invitee]
 
-  # like and repost mentions
+  # like and repost mentions. bucket the tags by type in one pass rather than
+  # re-scanning (and re-classifying) the whole list for each verb below
+  tags_by_type = {}
+  for t in tags:
+    tags_by_type.setdefault(object_type(t), []).append(t)
+
   for type, prop in (
       ('favorite', 'like'),
       ('follow', 'follow'),
@@ -368,11 +467,11 @@ def from_as1(obj, trim_nulls=True, entry_class='h-entry',
       # single object, but it's useful to let it be a list, eg when a like has
       # multiple targets, eg a like of a post with original post URLs in it,
       # which brid.gy does.
-      objs = as1.get_objects(obj)
+      objs = get_objects(obj)
       ret['properties'][prop + '-of'] = [
         # flatten contexts that are just a url
-        (o.get('url') or o.get('id')) if o.keys() <= set(['id', 'url', 'objectType'])
-        else object_to_json(o, trim_nulls=False, entry_class='h-cite')
+        (o.get('url') or o.get('id')) if o.keys() <= ID_ONLY_KEYS
+        else to_json(o, trim_nulls=False, entry_class='h-cite')
         for o in objs]
 
       # remove properties that aren't appropriate for this type and may confuse
@@ -383,8 +482,8 @@ def from_as1(obj, trim_nulls=True, entry_class='h-entry',
     else:
       # received likes and reposts
       ret['properties'][prop] = [
-        object_to_json(t, trim_nulls=False, entry_class='h-cite')
-        for t in tags if as1.object_type(t) == type]
+        to_json(t, trim_nulls=False, entry_class='h-cite')
+        for t in tags_by_type.get(type, [])]
 
   # bookmarks
   if obj_type == 'bookmark':
@@ -486,8 +585,9 @@ def to_as1(mf2, actor=None, fetch_mf2=False, rel_urls=None):
     # *is* a photo. so, special case photo type to fall through to underlying
     # mf2 type without photo.
     # https://github.com/snarfed/bridgy/issues/702
-    without_photo = copy.deepcopy(mf2)
-    without_photo.get('properties', {}).pop('photo', None)
+    # shallow-copy just the levels we modify; deepcopy would walk the whole tree
+    without_photo = {**mf2, 'properties': {
+      k: v for k, v in mf2.get('properties', {}).items() if k != 'photo'}}
     mf2_type = mf2util.post_type_discovery(without_photo)
 
   as_type, as_verb = MF2_TO_AS_TYPE_VERB.get(mf2_type, (None, None))
@@ -498,13 +598,9 @@ def to_as1(mf2, actor=None, fetch_mf2=False, rel_urls=None):
   # special case GitHub issues that are in-reply-to the repo or its issues URL
   in_reply_tos = get_string_urls(props.get('in-reply-to', []))
   for url in in_reply_tos:
-    if re.match(r'^https?://github.com/[^/]+/[^/]+(/issues)?/?$', url):
+    if GITHUB_REPO_ISSUES_RE.match(url):
       as_type = 'issue'
 
-  def is_absolute(url):
-    """Filter out relative and invalid URLs (mf2py gives absolute urls)."""
-    return urllib.parse.urlparse(url).netloc
-
   # urls, with displayName if available in rel_urls
   urls = []
   for u in get_string_urls(props.get('url')):
@@ -591,7 +687,7 @@ def to_as1(mf2, actor=None, fetch_mf2=False, rel_urls=None):
       photo = photo.get('properties') or photo
       url = get_first(photo, 'value') or get_first(photo, 'url')
       alt = get_first(photo, 'alt')
-    if url and url not in photo_urls and is_absolute(url):
+    if url and url not in photo_urls and _is_absolute(url):
       photo_urls.add(url)
       obj['image'].append({
         'url': url,
@@ -624,6 +720,7 @@ def to_as1(mf2, actor=None, fetch_mf2=False, rel_urls=None):
   objects = []
   if as_type == 'activity':
     objects = []
+    seen = set()
     field = ('invitee' if mf2_type == 'invite'
              else 'in-reply-to' if mf2_type == 'rsvp'
              else f'{mf2_type}-of' if mf2_type in ('bookmark', 'follow', 'like',
@@ -642,9 +739,12 @@ def to_as1(mf2, actor=None, fetch_mf2=False, rel_urls=None):
       elif mf2_type == 'bookmark':
         t = {'objectType': 'bookmark', 'targetUrl': util.get_url(t) or t}
 
-
-      # eliminate duplicates from redundant backcompat properties
-      if t not in objects:
+      # eliminate duplicates from redundant backcompat properties. dicts aren't
+      # hashable, so dedupe on serialized JSON instead of t not in objects,
+      # which is a linear scan with per-element dict comparison
+      key = t if isinstance(t, str) else json_dumps(t, sort_keys=True)
+      if key not in seen:
+        seen.add(key)
         objects.append(t)
 
     obj.update({
@@ -706,7 +806,7 @@ def hfeed_to_as1(parsed, actor=None):
   Returns:
     list of dict: ActivityStreams activities
   """
-  hfeed = mf2util.find_first_entry(parsed, ['h-feed'])
+  hfeed = _find_first_entry(parsed, ['h-feed'])
   items = hfeed.get('children', []) if hfeed else parsed.get('items', [])
 
   activities = []
@@ -779,6 +879,9 @@ def object_to_html(obj, parent_props=None, synthesize_content=True):
     to links if they have ``startIndex`` and ``length``, otherwise added to the
     end.
   """
+  if not obj:
+    return ''
+
   return json_to_html(object_to_json(obj, synthesize_content=synthesize_content),
                       parent_props=parent_props)
 
@@ -802,49 +905,56 @@ def json_to_html(obj, parent_props=None):
   if not parent_props:
     parent_props = []
 
+  # localize the recursive renderers; they're called per comment/child/target
+  to_html = json_to_html
+  to_hcard = hcard_to_html
+
   types = obj.get('type', [])
   if 'h-card' in types:
-    return hcard_to_html(obj, parent_props)
+    return to_hcard(obj, parent_props)
 
-  props = copy.copy(obj.get('properties', {}))
+  # copied on write below, iff we need to override name
+  props = obj.get('properties', {})
 
   links = []
   for prop in 'in-reply-to', 'tag-of':
-    links.extend(LINK.substitute(cls=prop, url=url)
+    links.extend(LINK.format(cls=prop, url=url)
                  for url in sorted(get_string_urls(props.get(prop, []))))
 
-  prop = first_props(props)
-  prop.setdefault('uid', '')
-  author = prop.get('author')
+  # pull out the first values we use below, instead of first_props(), which
+  # would build a throwaway dict covering every property
+  author = get_first(props, 'author')
 
   # if this post is an rsvp, populate its data element. if it's an invite, give
   # it a default name.
   # do this *before* content since it sets props['name'] if necessary.
-  rsvp = prop.get('rsvp')
+  rsvp = get_first(props, 'rsvp')
   if rsvp:
-    if not props.get('name'):
-      props['name'] = [{'yes': 'is attending.',
-                        'no': 'is not attending.',
-                        'maybe': 'might attend.'}.get(rsvp)]
-    props['name'][0] = {
-      'html': f"<data class=\"p-rsvp\" value=\"{rsvp}\">{props['name'][0]}</data>",
+    names = list(props.get('name') or [{'yes': 'is attending.',
+                                        'no': 'is not attending.',
+                                        'maybe': 'might attend.'}.get(rsvp)])
+    names[0] = {
+      'html': f'<data class="p-rsvp" value="{rsvp}">{names[0]}</data>',
     }
+    props = {**props, 'name': names}
 
   elif props.get('invitee') and not props.get('name'):
-    props['name'] = ['invited']
+    props = {**props, 'name': ['invited']}
 
   children = []
 
   # if this post is itself a follow, like, or repost, link to its target(s).
   for mftype in ['follow', 'like', 'repost']:
-    for target in props.get(mftype + '-of', []):
+    prop = f'{mftype}-of'
+    cls = f'u-{prop}'
+    for target in props.get(prop, []):
       if isinstance(target, str):
-        children.append(f'<a class="u-{mftype}-of" href="{target}"></a>')
+        children.append(f'<a class="{cls}" href="{target}"></a>')
       else:
-        children.append(json_to_html(target, ['u-' + mftype + '-of']))
+        children.append(to_html(target, [cls]))
 
   # set up content and name
-  content_html = get_html(prop.get('content', {}))
+  content_html = get_html(get_first(props, 'content') or {})
   content_classes = []
 
   if content_html:
@@ -856,10 +966,10 @@ def json_to_html(obj, parent_props=None):
     # microformats2 implied p-name handling.
     # https://github.com/snarfed/granary/issues/131
     if not props.get('name'):
-      props['name'] = ['']
+      props = {**props, 'name': ['']}
 
-  summary = (f"<div class=\"p-summary\">{prop.get('summary')}</div>"
-             if prop.get('summary') else '')
+  summary = get_first(props, 'summary')
+  summary = f'<div class="p-summary">{summary}</div>' if summary else ''
 
   # attachments
   # TODO: use photo alt property as alt text once mf2py handles that.
@@ -879,7 +989,7 @@ def json_to_html(obj, parent_props=None):
   # categories
   cats = props.get('category', [])
   people = [
-    hcard_to_html(cat, ['u-category', 'h-card']) for cat in cats
+    to_hcard(cat, ['u-category', 'h-card']) for cat in cats
     if isinstance(cat, dict) and 'h-card' in cat.get('type')
     and not cat.get('startIndex')]  # mentions are already linkified in content
   tags = [f'<span class="u-category">{cat}</span>'
@@ -888,7 +998,7 @@ def json_to_html(obj, parent_props=None):
   # comments
   # http://indiewebcamp.com/comment-presentation#How_to_markup
   # http://indiewebcamp.com/h-cite
-  comments_html = '\n'.join(json_to_html(c, ['p-comment'])
+  comments_html = '\n'.join(to_html(c, ['p-comment'])
                             for c in props.get('comment', []))
 
   # embedded likes and reposts of this post
@@ -899,13 +1009,14 @@ def json_to_html(obj, parent_props=None):
     if verb + '-of' not in props:
       vals = props.get(verb, [])
       if vals and isinstance(vals[0], dict):
-        children += [json_to_html(v, ['u-' + verb]) for v in vals]
+        # extend with a generator instead of building an intermediate list
+        children.extend(to_html(v, ['u-' + verb]) for v in vals)
 
   # embedded children of this post
-  children += [json_to_html(c) for c in obj.get('children', [])]
+  children.extend(to_html(c) for c in obj.get('children', []))
 
   # location; make sure it's an object
-  location = prop.get('location')
+  location = get_first(props, 'location')
   if isinstance(location, str):
     location = {'properties': {'name': [location]}}
 
@@ -913,24 +1024,24 @@ def json_to_html(obj, parent_props=None):
   event_times = []
   start = props.get('start', [])
   end = props.get('end', [])
-  event_times += [f'  <time class="dt-start">{time}</time>' for time in start]
+  event_times.extend(f'  <time class="dt-start">{time}</time>' for time in start)
   if start and end:
     event_times.append('  to')
-  event_times += [f'  <time class="dt-end">{time}</time>' for time in end]
+  event_times.extend(f'  <time class="dt-end">{time}</time>' for time in end)
 
-  return HENTRY.substitute(
-    prop,
-    published=maybe_datetime(prop.get('published'), 'dt-published'),
-    updated=maybe_datetime(prop.get('updated'), 'dt-updated'),
+  return HENTRY.render(
+    uid=get_first(props, 'uid', ''),
+    published=maybe_datetime(get_first(props, 'published'), 'dt-published'),
+    updated=maybe_datetime(get_first(props, 'updated'), 'dt-updated'),
     types=' '.join(parent_props + types),
-    author=hcard_to_html(author, ['p-author']),
-    location=hcard_to_html(location, ['p-location']),
+    author=to_hcard(author, ['p-author']),
+    location=to_hcard(location, ['p-location']),
     categories='\n'.join(people + tags),
     attachments='\n'.join(attachments),
     sizes='\n'.join(sizes),
     links='\n'.join(links),
-    invitees='\n'.join([hcard_to_html(i, ['p-invitee'])
-                        for i in props.get('invitee', [])]),
+    invitees='\n'.join(to_hcard(i, ['p-invitee'])
+                       for i in props.get('invitee', [])),
     content=content_html,
     content_classes=' '.join(content_classes),
     comments=comments_html,
@@ -965,7 +1076,7 @@ def hcard_to_html(hcard, parent_props=None):
   if not prop:
     return ''
 
-  return HCARD.substitute(
+  return HCARD.render(
     types=' '.join(uniquify(parent_props + hcard.get('type', []))),
     ids='\n'.join([f'<data class="p-uid" value="{uid}"></data>'
                    for uid in props.get('uid', []) if uid] +
@@ -1010,6 +1121,7 @@ def render_content(obj, include_location=True, synthesize_content=True,
   seen_ids = set()
   mentions = []
   tags = {}  # maps string objectType to list of tag objects
+  object_type = as1.object_type  # avoid module attribute lookups in the loop
   for t in obj.get('tags', []):
     id = t.get('id')
     if id and id in seen_ids:
@@ -1019,7 +1131,11 @@ def render_content(obj, include_location=True, synthesize_content=True,
     if 'startIndex' in t and 'length' in t and 'url' in t:
       mentions.append(t)
     else:
-      tags.setdefault(as1.object_type(t), []).append(t)
+      type = object_type(t)
+      bucket = tags.get(type)
+      if bucket is None:
+        bucket = tags[type] = []
+      bucket.append(t)
 
   # linkify embedded mention tags inside content.
   # TODO: duplicated in :func:`as2.link_tags`. unify?
@@ -1027,14 +1143,17 @@ def render_content(obj, include_location=True, synthesize_content=True,
     mentions.sort(key=lambda t: t['startIndex'])
     last_end = 0
     orig = content
-    content = ''
+    # build in a list and join once instead of repeated string concatenation,
+    # which reallocates the growing result per mention
+    parts = []
     for tag in mentions:
       start = tag['startIndex']
       end = start + tag['length']
-      content = f"{content}{orig[last_end:start]}<a href=\"{tag['url']}\">{orig[start:end]}</a>"
+      parts.append(f"{orig[last_end:start]}<a href=\"{tag['url']}\">{orig[start:end]}</a>")
       last_end = end
 
-    content += orig[last_end:]
+    parts.append(orig[last_end:])
+    content = ''.join(parts)
 
   # is whitespace in this content meaningful? standard heuristic: if there are
   # no HTML tags in it, and it has a newline, then assume yes.
@@ -1052,20 +1171,25 @@ def render_content(obj, include_location=True, synthesize_content=True,
   # if content:
   #   content = util.linkify(content)
 
+  # collect the rest in a list and join once at the end; repeated content +=
+  # reallocates the growing string on every concatenation
+  parts = [content]
+  append = parts.append
+
   # the image field. may be multiply valued.
   rendered_urls = set()
   if render_image:
     urls = get_urls(obj, 'image')
-    content += _render_attachments([{
+    append(_render_attachments([{
       'objectType': 'image',
       'image': {'url': url},
-    } for url in urls], obj)
+    } for url in urls], obj))
     rendered_urls = set(urls)
 
   # bookmarked URL
   targetUrl = obj.get('targetUrl')
   if obj_type == 'bookmark' and targetUrl:
-    content += f"\nBookmark: {util.pretty_link(targetUrl, attrs={'class': 'u-bookmark-of'})}"
+    append(f"\nBookmark: {util.pretty_link(targetUrl, attrs={'class': 'u-bookmark-of'})}")
 
   # attachments, eg links (aka articles)
   # TODO: use oEmbed? http://oembed.com/ , http://code.google.com/p/python-oembed/
@@ -1073,7 +1197,7 @@ def render_content(obj, include_location=True, synthesize_content=True,
     atts = [a for a in obj.get('attachments', [])
             if a.get('objectType') not in ('note', 'article', 'comment')
             and get_url(a, 'image') not in rendered_urls]
-    content += _render_attachments(atts + tags.pop('article', []), obj)
+    append(_render_attachments(atts + tags.pop('article', []), obj))
 
   # generate share/like contexts if the activity does not have content
   # of its own
@@ -1088,8 +1212,8 @@ def render_content(obj, include_location=True, synthesize_content=True,
 
       # sometimes likes don't have enough content to render anything
       # interesting
-      if target.keys() <= set(['id', 'url', 'objectType']):
-        content += f"<a href=\"{target_url}\">{verb.lower()} this.</a>"
+      if target.keys() <= ID_ONLY_KEYS:
+        append(f"<a href=\"{target_url}\">{verb.lower()} this.</a>")
 
       else:
         author = (as1.get_object(target, 'author')
@@ -1097,14 +1221,14 @@ def render_content(obj, include_location=True, synthesize_content=True,
         # special case for twitter RT's
         if obj_type == 'share' and 'url' in obj and re.search(
             r'^https?://(?:www\.|mobile\.)?twitter\.com/', obj.get('url')):
-          content += f"RT <a href=\"{target_url}\">@{author.get('username')}</a> "
+          append(f"RT <a href=\"{target_url}\">@{author.get('username')}</a> ")
         else:
           # image looks bad in the simplified rendering
           author = {k: v for k, v in author.items() if k != 'image'}
-          content += f"{verb} <a href=\"{target_url}\">{target.get('displayName', target.get('title', 'a post'))}</a> by {hcard_to_html(object_to_json(author, default_object_type='person'))}"
-        content += render_content(target, include_location=include_location,
-                                  synthesize_content=synthesize_content,
-                                  white_space_pre=white_space_pre)
+          append(f"{verb} <a href=\"{target_url}\">{target.get('displayName', target.get('title', 'a post'))}</a> by {hcard_to_html(object_to_json(author, default_object_type='person'))}")
+        append(render_content(target, include_location=include_location,
+                              synthesize_content=synthesize_content,
+                              white_space_pre=white_space_pre))
       # only include the first context in the content (if there are
       # others, they'll be included as separate properties)
       break
@@ -1114,23 +1238,24 @@ def render_content(obj, include_location=True, synthesize_content=True,
     atts = [att for att in itertools.chain.from_iterable(
               o.get('attachments', []) for o in as1.get_objects(obj))
             if att.get('objectType') not in ('note', 'article', 'comment')]
-    content += _render_attachments(atts, obj)
+    append(_render_attachments(atts, obj))
 
   # location
   loc = obj.get('location')
   if include_location and loc:
-    content += f"\n<p>{hcard_to_html(object_to_json(loc, default_object_type='place'), parent_props=['p-location'])}</p>"
+    append(f"\n<p>{hcard_to_html(object_to_json(loc, default_object_type='place'), parent_props=['p-location'])}</p>")
 
   # these are rendered manually in json_to_html()
   for type in set(('like', 'share', 'react')) | as1.ACTOR_TYPES:
     tags.pop(type, None)
 
   # render the rest
-  content += tags_to_html(tags.pop('hashtag', []), 'p-category')
-  content += tags_to_html(tags.pop('mention', []), 'u-mention', visible=False)
-  content += tags_to_html(sum(tags.values(), []), 'tag')
+  append(tags_to_html(tags.pop('hashtag', []), 'p-category'))
+  append(tags_to_html(tags.pop('mention', []), 'u-mention', visible=False))
+  # chain instead of sum(..., []), which reallocates a growing list per bucket
+  append(tags_to_html(itertools.chain.from_iterable(tags.values()), 'tag'))
 
-  return content
+  return ''.join(parts)
 
 
 def _render_attachments(attachments, obj):
@@ -1143,7 +1268,8 @@ def _render_attachments(attachments, obj):
   Returns:
     str: rendered HTML
   """
-  content = ''
+  parts = []
+  append = parts.append
 
   for att in attachments:
     name = att.get('displayName') or ''
@@ -1154,35 +1280,35 @@ def _render_attachments(attachments, obj):
     image = image_obj.get('id') or image_obj.get('url') or ''
 
     open_a_tag = False
-    content += '\n<p>'
+    append('\n<p>')
 
     type = att.get('objectType')
     if type == 'video':
       if stream:
-        content += vid(stream, poster=image)
+        append(vid(stream, poster=image))
     elif type == 'audio':
       if stream:
-        content += aud(stream)
+        append(aud(stream))
     else:
       url = att.get('url') or obj.get('url')
       if url:
-        content += f'\n<a class="link" href="{url}">'
+        append(f'\n<a class="link" href="{url}">')
         open_a_tag = True
       if image:
-        content += '\n' + img(image, name)
+        append('\n' + img(image, name))
 
     if name and type != 'image':
-      content += f'\n<span class="name">{name}</span>'
+      append(f'\n<span class="name">{name}</span>')
 
     if open_a_tag:
-      content += '\n</a>'
+      append('\n</a>')
 
     summary = att.get('summary')
     if summary and summary != name:
-      content += f'\n<span class="summary">{summary}</span>'
-    content += '\n</p>'
+      append(f'\n<span class="summary">{summary}</span>')
+    append('\n</p>')
 
-  return content
+  return ''.join(parts)
 
 
 def find_author(parsed, **kwargs):
@@ -1254,16 +1380,18 @@ def tags_to_html(tags, classname, visible=True):
   """
   urls = {}  # stores (url, displayName) tuples
   for tag in tags:
-    name = ''
-    if visible and tag.get('displayName'):
-      name = get_html(tag['displayName'])
+    name = tag.get('displayName') if visible else None
+    name = get_html(name) if name else ''
     # loop through individually instead of using update() so that order is
     # preserved.
     for url in as1.object_urls(tag):
       urls[url, name] = None
 
-  return ''.join('\n<a class="%s" %shref="%s">%s</a>' %
-                 (classname, '' if name else 'aria-hidden="true" ', url, name)
+  # bake classname into the format strings once instead of re-interpolating it
+  # (and re-testing name) per tag
+  named = f'\n<a class="{classname}" href="%s">%s</a>'
+  hidden = f'\n<a class="{classname}" aria-hidden="true" href="%s"></a>'
+  return ''.join(named % (url, name) if name else hidden % url
                  for url, name in sorted(urls.keys()))
 
 
@@ -1319,7 +1447,7 @@ def img(src, alt=''):
     assert not alt
     alt = src.get('alt') or ''
     src = src.get('value')
-  return f"<img class=\"u-photo\" src=\"{src}\" alt={xml.sax.saxutils.quoteattr(alt or '')} />"
+  return f"<img class=\"u-photo\" src=\"{src}\" alt={_quoteattr(alt or '')} />"
 
 
 def vid(src, poster=''):
@@ -37,11 +37,20 @@ TODO:
 * 65: user relays. what would this be in AS1? anything?
 """
 from datetime import datetime
+import functools
 from hashlib import sha256
 import logging
 import secrets
 
 import bech32
+try:
+  import ciso8601
+except ImportError:
+  ciso8601 = None
+try:
+  import orjson
+except ImportError:
+  orjson = None
 from oauth_dropins.webutil import util
 from oauth_dropins.webutil.util import HTTP_TIMEOUT, json_dumps, json_loads
 from websockets.exceptions import ConnectionClosedOK
@@ -72,6 +81,73 @@ PLATFORMS = {
   'twitter': 'https://twitter.com/',
   'mastodon': 'https://',
 }
+# base URLs that identify a NIP-39 platform. Mastodon is excluded since we
+# can't tell which URLs might be Mastodon instances.
+PLATFORM_BY_BASE_URL = {
+  base_url: platform for platform, base_url in PLATFORMS.items()
+  if platform != 'mastodon'
+}
+PLATFORM_BASE_URLS = tuple(PLATFORM_BY_BASE_URL)
+
+# the event fields that NIP-01 ids are computed over
+ID_FIELDS = frozenset(('content', 'created_at', 'kind', 'pubkey', 'tags'))
+
+# AS1 type groups that from_as1 branches on
+WRAPPER_TYPES = frozenset(('post', 'update'))
+NOTE_TYPES = frozenset(('article', 'note'))
+REACTION_TYPES = frozenset(('like', 'dislike', 'react'))
+
+def _json_loads(val):
+  """Parses JSON with orjson if it's available, stdlib json otherwise.
+
+  orjson is noticeably faster on relay message and embedded event payloads.
+  Serializing stays on stdlib json since its output bytes feed event ids.
+
+  Args:
+    val (str or bytes): encoded JSON
+
+  Returns:
+    dict or list: decoded JSON
+  """
+  return orjson.loads(val) if orjson else json_loads(val)
+
+
+@functools.lru_cache(maxsize=1024)
+def _timestamp_to_iso(ts):
+  """Converts a Unix timestamp to an ISO 8601 string, memoized.
+
+  Events fetched together often share ``created_at`` values down to the
+  second, so caching skips most of the datetime construction.
+
+  Args:
+    ts (int): Unix timestamp
+
+  Returns:
+    str: ISO 8601 timestamp
+  """
+  # measurably faster than the time.localtime/strftime equivalents; both
+  # fromtimestamp and isoformat are C in CPython
+  return datetime.fromtimestamp(ts).isoformat()
+
+
+@functools.lru_cache(maxsize=1024)
+def _iso_to_timestamp(published):
+  """Converts an ISO 8601 string to an integer Unix timestamp, memoized.
+
+  Args:
+    published (str): ISO 8601 timestamp
+
+  Returns:
+    int: Unix timestamp
+  """
+  if ciso8601:
+    try:
+      return int(ciso8601.parse_datetime(published).timestamp())
+    except ValueError:  # fall back to the more lenient pure-Python parser
+      pass
+
+  return int(util.parse_iso8601(published).timestamp())
+
 
 def id_for(event):
   """Generates an id for a Nostr event.
@@ -84,7 +160,7 @@ def id_for(event):
     according to NIP-01
   """
   event.setdefault('tags', [])
-  assert event.keys() == set(('content', 'created_at', 'kind', 'pubkey', 'tags'))
+  assert event.keys() == ID_FIELDS
   return sha256(json_dumps([
     0,
     event['pubkey'],
@@ -95,20 +171,47 @@ def id_for(event):
   ]).encode()).hexdigest()
 
 
-def is_bech32(id):
-  if not id:
-    return False
+def id_for_many(events):
+  """Generates ids for multiple Nostr events.
+
+  Batch version of :func:`id_for` for bulk ingestion; hoists the serializer
+  and hash lookups out of the loop.
+
+  Args:
+    events (sequence of dict): Nostr events
+
+  Returns:
+    list of str: hex-encoded sha256 event ids, in the same order as ``events``
+  """
+  dumps = json_dumps
+  digest = sha256
+  ids = []
+  for event in events:
+    event.setdefault('tags', [])
+    assert event.keys() == ID_FIELDS
+    ids.append(digest(dumps([
+      0,
+      event['pubkey'],
+      event['created_at'],
+      event['kind'],
+      event['tags'],
+      event['content'],
+    ]).encode()).hexdigest())
+
+  return ids
+
 
-  id = id.removeprefix('nostr:')
-  for prefix in BECH32_PREFIXES:
-    if id.startswith(prefix):
-      return True
+def is_bech32(id):
+  return bool(id) and id.removeprefix('nostr:').startswith(BECH32_PREFIXES)
 
 
+@functools.lru_cache(maxsize=1024)
 def uri_to_id(uri):
   """Converts a nostr: URI with bech32-encoded id to a hex sha256 hash id.
 
-  Based on NIP-19 and NIP-21.
+  Based on NIP-19 and NIP-21. Memoized, since the bech32 codec is pure
+  Python and the same pubkeys and event ids recur constantly within and
+  across events.
 
   Args:
     uri (str)
@@ -116,17 +219,22 @@ def uri_to_id(uri):
   Returns:
     str:
   """
-  if not uri or not is_bech32(uri):
+  if not uri:
     return uri
 
-  prefix, data = bech32.bech32_decode(uri.removeprefix('nostr:'))
+  id = uri.removeprefix('nostr:')
+  if not id.startswith(BECH32_PREFIXES):
+    return uri
+
+  prefix, data = bech32.bech32_decode(id)
   return bytes(bech32.convertbits(data, 5, 8, pad=False)).hex()
 
 
+@functools.lru_cache(maxsize=1024)
 def id_to_uri(prefix, id):
   """Converts a hex sha256 hash id to a nostr: URI with bech32-encoded id.
 
-  Based on NIP-19 and NIP-21.
+  Based on NIP-19 and NIP-21. Memoized like :func:`uri_to_id`.
 
   Args:
     prefix (str)
@@ -162,7 +270,7 @@ def from_as1(obj):
 
   published = obj.get('published')
   if published:
-    event['created_at'] = int(util.parse_iso8601(published).timestamp())
+    event['created_at'] = _iso_to_timestamp(published)
 
   # types
   if type in as1.ACTOR_TYPES:
@@ -180,16 +288,16 @@ def from_as1(obj):
       }, sort_keys=True),
     })
     for url in as1.object_urls(obj):
-      for platform, base_url in PLATFORMS.items():
-        # we don't known which URLs might be Mastodon, so don't try to guess
-          if platform != 'mastodon' and url.startswith(base_url):
+      if url.startswith(PLATFORM_BASE_URLS):
+        for base_url, platform in PLATFORM_BY_BASE_URL.items():
+          if url.startswith(base_url):
             event['tags'].append(
               ['i', f'{platform}:{url.removeprefix(base_url)}', '-'])
 
-  elif type in ('post', 'update'):
+  elif type in WRAPPER_TYPES:
     return from_as1(inner_obj)
 
-  elif type in ('article', 'note'):
+  elif type in NOTE_TYPES:
     event.update({
       'kind': 1 if type == 'note' else 30023,
     })
@@ -236,7 +344,7 @@ def from_as1(obj):
         ['p', orig_event.get('pubkey')],
       ]
 
-  elif type in ('like', 'dislike', 'react'):
+  elif type in REACTION_TYPES:
     liked = inner_obj.get('id')
     event.update({
       'kind': 7,
@@ -268,6 +376,146 @@ def from_as1(obj):
   return util.trim_nulls(event, ignore=['tags'])
 
 
+def _profile_to_as1(event, obj, tags, content):
+  """Populates an AS1 person from a kind 0 profile event."""
+  content = _json_loads(content) or {}
+  nip05_domain = (content['nip05'].removeprefix('_@')
+                  if isinstance(content.get('nip05'), str)
+                  else '')
+  obj.update({
+    'objectType': 'person',
+    'id': id_to_uri('npub', event['pubkey']),
+    'displayName': content.get('name'),
+    'description': content.get('about'),
+    'image': content.get('picture'),
+    'username': nip05_domain,
+    'urls': [],
+  })
+  urls = obj['urls']
+  for tag in tags:
+    if tag[0] == 'i':
+      platform, identity = tag[1].split(':')
+      base_url = PLATFORMS.get(platform)
+      if base_url:
+        urls.append(base_url + identity)
+
+
+def _note_to_as1(event, obj, tags, content):
+  """Populates an AS1 note or article from a kind 1 or 30023 event."""
+  obj.update({
+    'objectType': 'note' if event['kind'] == 1 else 'article',
+    'id': id_to_uri('note', event.get('id')),
+    # TODO: render Markdown to HTML
+    'content': content,
+    'tags': [],
+  })
+
+  pubkey = event.get('pubkey')
+  if pubkey:
+    obj['author'] = id_to_uri('npub', pubkey)
+
+  obj_tags = obj['tags']
+  for tag in tags:
+    type = tag[0]
+    if type == 'e' and tag[-1] == 'reply':
+      obj['inReplyTo'] = id_to_uri('nevent', tag[1])
+    elif type == 't' and len(tag) >= 2:
+      obj_tags.extend({'objectType': 'hashtag', 'displayName': t}
+                      for t in tag[1:])
+    elif type in ('title', 'summary'):
+      obj[type] = tag[1]
+    elif type == 'subject':  # NIP-14 subject tag
+      obj.setdefault('title', tag[1])
+    elif type == 'location':
+      obj['location'] = {'displayName': tag[1]}
+
+
+def _repost_to_as1(event, obj, tags, content):
+  """Populates an AS1 share activity from a kind 6 or 16 repost event."""
+  obj.update({
+    'objectType': 'activity',
+    'verb': 'share',
+  })
+
+  # NIP-18 reposts may embed the original event as JSON content. It takes
+  # precedence over the 'e' tag, so only scan the tags if it's not usable.
+  if content and content.startswith('{'):
+    try:
+      obj['object'] = to_as1(_json_loads(content))
+      return
+    except ValueError as err:
+      logger.warning(f"Couldn't decode repost content as JSON: {err}")
+
+  for tag in tags:
+    if tag[0] == 'e' and tag[-1] == 'mention':
+      obj['object'] = id_to_uri('note', tag[1])
+
+
+def _reaction_to_as1(event, obj, tags, content):
+  """Populates an AS1 like/dislike/react activity from a kind 7 event."""
+  obj.update({
+    'objectType': 'activity',
+  })
+
+  if content == '+':
+    obj['verb'] = 'like'
+  elif content == '-':
+    obj['verb'] = 'dislike'
+  else:
+    obj['verb'] = 'react'
+    obj['content'] = content
+
+  for tag in tags:
+    if tag[0] == 'e':
+      obj['object'] = id_to_uri('nevent', tag[1])
+
+
+def _delete_to_as1(event, obj, tags, content):
+  """Populates an AS1 delete activity from a kind 5 event."""
+  obj.update({
+    'objectType': 'activity',
+    'verb': 'delete',
+    'object': [],
+    'content': content,
+  })
+
+  objects = obj['object']
+  for tag in tags:
+    # TODO: support NIP-33 'a' tags
+    if tag[0] == 'e':
+      objects.append(id_to_uri('nevent', tag[1]))
+
+
+def _follow_to_as1(event, obj, tags, content):
+  """Populates an AS1 follow activity from a kind 3 contacts event."""
+  obj.update({
+    'objectType': 'activity',
+    'verb': 'follow',
+    'object': [],
+    'content': content,
+  })
+
+  objects = obj['object']
+  for tag in tags:
+    if tag[0] == 'p':
+      name = tag[3] if len(tag) >= 4 else None
+      id = id_to_uri('npub', tag[1])
+      objects.append({'id': id, 'displayName': name} if name else id)
+
+
+# maps event kind to the to_as1 handler for it
+_TO_AS1_BY_KIND = {
+  0: _profile_to_as1,
+  1: _note_to_as1,
+  3: _follow_to_as1,
+  5: _delete_to_as1,
+  6: _repost_to_as1,
+  7: _reaction_to_as1,
+  16: _repost_to_as1,
+  30023: _note_to_as1,
+}
+
+
 def to_as1(event):
   """Converts a Nostr event to an ActivityStreams 2 activity or object.
 
@@ -280,121 +528,20 @@ def to_as1(event):
   if not event:
     return {}
 
-  kind = event['kind']
-  id = event.get('id')
   tags = event.get('tags', [])
   content = event.get('content')
   obj = {
-    'id': id_to_uri('nevent', id)
+    'id': id_to_uri('nevent', event.get('id'))
   }
 
-  if kind == 0:  # profile
-    content = json_loads(content) or {}
-    nip05_domain = (content['nip05'].removeprefix('_@')
-                    if isinstance(content.get('nip05'), str)
-                    else '')
-    obj.update({
-      'objectType': 'person',
-      'id': id_to_uri('npub', event['pubkey']),
-      'displayName': content.get('name'),
-      'description': content.get('about'),
-      'image': content.get('picture'),
-      'username': nip05_domain,
-      'urls': [],
-    })
-    for tag in tags:
-      if tag[0] == 'i':
-        platform, identity = tag[1].split(':')
-        base_url = PLATFORMS.get(platform)
-        if base_url:
-          obj['urls'].append(base_url + identity)
-
-  elif kind in (1, 30023):  # note, article
-    obj.update({
-      'objectType': 'note' if kind == 1 else 'article',
-      'id': id_to_uri('note', id),
-      # TODO: render Markdown to HTML
-      'content': event.get('content'),
-      'tags': [],
-    })
-
-    pubkey = event.get('pubkey')
-    if pubkey:
-      obj['author'] = id_to_uri('npub', pubkey)
-
-    for tag in tags:
-      type = tag[0]
-      if type == 'e' and tag[-1] == 'reply':
-        obj['inReplyTo'] = id_to_uri('nevent', tag[1])
-      elif type == 't' and len(tag) >= 2:
-        obj['tags'].extend({'objectType': 'hashtag', 'displayName': t}
-                           for t in tag[1:])
-      elif type in ('title', 'summary'):
-        obj[type] = tag[1]
-      elif type == 'subject':  # NIP-14 subject tag
-        obj.setdefault('title', tag[1])
-      elif type == 'location':
-        obj['location'] = {'displayName': tag[1]}
-
-  elif kind in (6, 16):  # repost
-    obj.update({
-      'objectType': 'activity',
-      'verb': 'share',
-    })
-    for tag in tags:
-      if tag[0] == 'e' and tag[-1] == 'mention':
-        obj['object'] = id_to_uri('note', tag[1])
-    if content and content.startswith('{'):
-      obj['object'] = to_as1(json_loads(content))
-
-  elif kind == 7:  # like/reaction
-    obj.update({
-      'objectType': 'activity',
-    })
-
-    if content == '+':
-      obj['verb'] = 'like'
-    elif content == '-':
-      obj['verb'] = 'dislike'
-    else:
-      obj['verb'] = 'react'
-      obj['content'] = content
-
-    for tag in tags:
-      if tag[0] == 'e':
-        obj['object'] = id_to_uri('nevent', tag[1])
-
-  elif kind == 5:  # delete
-    obj.update({
-      'objectType': 'activity',
-      'verb': 'delete',
-      'object': [],
-      'content': content,
-    })
-
-    for tag in tags:
-      # TODO: support NIP-33 'a' tags
-      if tag[0] == 'e':
-        obj['object'].append(id_to_uri('nevent', tag[1]))
-
-  elif kind == 3:  # follow
-    obj.update({
-      'objectType': 'activity',
-      'verb': 'follow',
-      'object': [],
-      'content': content,
-    })
-
-    for tag in tags:
-      if tag[0] == 'p':
-        name = tag[3] if len(tag) >= 4 else None
-        id = id_to_uri('npub', tag[1])
-        obj['object'].append({'id': id, 'displayName': name} if name else id)
+  handler = _TO_AS1_BY_KIND.get(event['kind'])
+  if handler:
+    handler(event, obj, tags, content)
 
   # common fields
   created_at = event.get('created_at')
   if created_at:
-    obj['published'] = datetime.fromtimestamp(created_at).isoformat()
+    obj['published'] = _timestamp_to_iso(created_at)
 
   if isinstance(obj.get('object'), list) and len(obj['object']) == 1:
     obj['object'] = obj['object'][0]
@@ -515,7 +662,7 @@ class Nostr(Source):
             if activity:
               activity.setdefault('tags', []).append(obj)
 
-    return self.make_activities_base_response(util.trim_nulls(activities.values()))
+    return self.make_activities_base_response(activities.values())
 
   def query(self, websocket, filter):
     """Runs a Nostr ``REQ`` query on an open websocket.
@@ -550,7 +697,7 @@ class Nostr(Source):
         logger.warning(err)
         return events
 
-      resp = json_loads(msg)
+      resp = _json_loads(msg)
       if resp[:3] == ['OK', subscription, False]:
         return events
       elif resp[:2] == ['EVENT', subscription]:
@@ -600,7 +747,7 @@ class Nostr(Source):
         logger.warning(cc)
         return
 
-    resp = json_loads(msg)
+    resp = _json_loads(msg)
     if resp[:3] == ['OK', event['id'], True]:
       return creation_result(event)
 
@@ -935,6 +935,23 @@ class Source(object, metaclass=SourceMeta):
     if type == 'article':
       kwargs.setdefault('format', brevity.FORMAT_ARTICLE)
 
+    else:
+      # fast path: most posts fit under the limit untouched, so skip brevity's
+      # full truncation pass when an upper bound on its weighted length
+      # already fits. brevity weighs each character at most 2 and counts each
+      # link as link_length, so this bound can only overestimate. doesn't
+      # apply to INCLUDE_LINK, which appends the permalink even when nothing
+      # is truncated, or to articles, which are reformatted as 'name: url'.
+      if include_link != INCLUDE_LINK:
+        target_length = (kwargs.get('target_length')
+                         or brevity.WEIGHTS['maxWeightedTweetLength'])
+        link_length = (kwargs.get('link_length')
+                       or brevity.WEIGHTS['transformedURLLength'])
+        bound = sum(link_length if token.tag == 'link' else 2 * len(token.content)
+                    for token in brevity.tokenize(content))
+        if bound <= target_length:
+          return content + (' ' + quote_url if quote_url else '')
+
     truncated = brevity.shorten(content, **kwargs)
 
     if quote_url:
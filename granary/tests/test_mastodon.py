@@ -1,8 +1,12 @@
 """Unit tests for mastodon.py."""
+from concurrent.futures import ThreadPoolExecutor
 import copy
+import threading
 
+from mox3 import mox
 from oauth_dropins.webutil import testutil, util
 from oauth_dropins.webutil.util import json_dumps, json_loads
+import requests
 from requests import HTTPError
 
 from .. import mastodon
@@ -318,6 +322,8 @@ class MastodonTest(testutil.TestCase):
     super(MastodonTest, self).setUp()
     self.mastodon = mastodon.Mastodon(INSTANCE, user_id=ACCOUNT['id'],
                                       access_token='towkin')
+    mastodon._rate_limiters.clear()
+    mastodon.base_object_cache.clear()
 
   def expect_get(self, *args, **kwargs):
     return self._expect_api(self.expect_requests_get, *args, **kwargs)
@@ -531,6 +537,36 @@ class MastodonTest(testutil.TestCase):
       self.mastodon.get_activities()
     self.assert_equals(502, e.exception.response.status_code)
 
+  def test_get_activities_fetches_next_pages(self):
+    self.expect_get(API_TIMELINE, params={'limit': 3}, response=[STATUS],
+                    response_headers={
+                      'Link': f'<{INSTANCE}{API_TIMELINE}?max_id=9>; rel="next"',
+                    })
+    self.expect_get(API_TIMELINE + '?max_id=9', params=None,
+                    response=[STATUS, STATUS])
+    self.mox.ReplayAll()
+
+    self.assert_equals([ACTIVITY, ACTIVITY, ACTIVITY],
+                       self.mastodon.get_activities(count=3))
+
+  def test_get_activities_next_page_overshoots_count(self):
+    self.expect_get(API_TIMELINE, params={'limit': 3}, response=[STATUS, STATUS],
+                    response_headers={
+                      'Link': f'<{INSTANCE}{API_TIMELINE}?max_id=9>; rel="next"',
+                    })
+    self.expect_get(API_TIMELINE + '?max_id=9', params=None,
+                    response=[STATUS, STATUS, STATUS])
+    self.mox.ReplayAll()
+
+    self.assert_equals([ACTIVITY, ACTIVITY, ACTIVITY],
+                       self.mastodon.get_activities(count=3))
+
+  def test_get_activities_no_next_page(self):
+    self.expect_get(API_TIMELINE, params={'limit': 3}, response=[STATUS])
+    self.mox.ReplayAll()
+
+    self.assert_equals([ACTIVITY], self.mastodon.get_activities(count=3))
+
   def test_get_activities_json_truncated(self):
     self.expect_get(API_TIMELINE, params={}, response='{"foo": "bar", "oops',
                     content_type='application/json')
@@ -539,7 +575,9 @@ class MastodonTest(testutil.TestCase):
     with self.assertRaises(HTTPError) as e:
       self.mastodon.get_activities()
     self.assert_equals(502, e.exception.response.status_code)
-    self.assertIn('Unterminated string', str(e.exception))
+    self.assertIn('unexpected end of data' if mastodon.orjson
+                  else 'Unterminated string',
+                  str(e.exception))
 
   def test_get_activities_returns_content_type_text(self):
     """Truth Social does this.
@@ -599,6 +637,99 @@ class MastodonTest(testutil.TestCase):
     self.mox.ReplayAll()
     self.assert_equals(OBJECT, self.mastodon.get_comment(1))
 
+  def test_api_uses_provided_session(self):
+    sess = self.mox.CreateMock(requests.Session)
+    sess.get(f'{INSTANCE}{API_STATUS % 1}', headers=mox.IgnoreArg(),
+             timeout=util.HTTP_TIMEOUT, stream=True).AndReturn(
+               testutil.requests_response(STATUS, content_type='application/json'))
+    self.mox.ReplayAll()
+
+    masto = mastodon.Mastodon(INSTANCE, user_id=ACCOUNT['id'],
+                              access_token='towkin', session=sess)
+    self.assert_equals(OBJECT, masto.get_comment(1))
+
+  def test_get_single_flight(self):
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def fake_api(fn, path, **kwargs):
+      calls.append(path)
+      started.set()
+      release.wait(timeout=5)
+      return {'id': '1'}
+
+    self.mastodon._api = fake_api
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+      first = pool.submit(self.mastodon._get, API_STATUS % 1)
+      assert started.wait(timeout=5)
+      # in flight now; this identical GET should wait on it and share its
+      # result rather than fetching again
+      threading.Timer(0.5, release.set).start()
+      self.assertEqual({'id': '1'}, self.mastodon._get(API_STATUS % 1))
+      self.assertEqual({'id': '1'}, first.result(timeout=5))
+
+    self.assertEqual([API_STATUS % 1], calls)
+
+    # no longer in flight; a later call fetches again
+    release.set()
+    self.assertEqual({'id': '1'}, self.mastodon._get(API_STATUS % 1))
+    self.assertEqual([API_STATUS % 1, API_STATUS % 1], calls)
+
+  def test_get_not_shared_across_access_tokens(self):
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def fake_api_mine(fn, path, **kwargs):
+      calls.append(('mine', path))
+      started.set()
+      release.wait(timeout=5)
+      return {'id': 'mine'}
+
+    def fake_api_other(fn, path, **kwargs):
+      calls.append(('other', path))
+      return {'id': 'other'}
+
+    self.mastodon._api = fake_api_mine
+    other = mastodon.Mastodon(INSTANCE, user_id=ACCOUNT['id'],
+                              access_token='uvver')
+    other._api = fake_api_other
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+      first = pool.submit(self.mastodon._get, API_VERIFY_CREDENTIALS)
+      assert started.wait(timeout=5)
+      # same instance and path, different token: must not share the in-flight
+      # response, since it's scoped to the other user
+      threading.Timer(0.5, release.set).start()
+      self.assertEqual({'id': 'other'}, other._get(API_VERIFY_CREDENTIALS))
+      self.assertEqual({'id': 'mine'}, first.result(timeout=5))
+
+    self.assertEqual([('mine', API_VERIFY_CREDENTIALS),
+                      ('other', API_VERIFY_CREDENTIALS)], calls)
+
+  def test_api_retries_rate_limited_call(self):
+    self.mox.StubOutWithMock(mastodon, 'sleep_fn')
+    self.expect_get(API_STATUS % 1, status_code=429)
+    mastodon.sleep_fn(1)
+    self.expect_get(API_STATUS % 1, STATUS)
+    self.mox.ReplayAll()
+    self.assert_equals(OBJECT, self.mastodon.get_comment(1))
+
+  def test_api_sleeps_when_rate_limit_exhausted(self):
+    self.mox.StubOutWithMock(mastodon, 'sleep_fn')
+    self.expect_get(API_STATUS % 1, STATUS, response_headers={
+      'X-RateLimit-Remaining': '0',
+      'X-RateLimit-Reset': '2099-01-01T00:00:00.000Z',
+    })
+    mastodon.sleep_fn(mox.IgnoreArg())
+    self.expect_get(API_STATUS % 1, STATUS)
+    self.mox.ReplayAll()
+
+    self.assert_equals(OBJECT, self.mastodon.get_comment(1))
+    self.assert_equals(OBJECT, self.mastodon.get_comment(1))
+
   def test_to_as1_actor(self):
     self.assert_equals(ACTOR, self.mastodon.to_as1_actor(ACCOUNT))
 
@@ -667,6 +798,25 @@ class MastodonTest(testutil.TestCase):
     self.assertIsNone(result.error_plain)
     self.assertIsNone(result.error_html)
 
+  def test_create_many(self):
+    self.expect_post(API_STATUSES, json={'status': 'foo ☕ bar'},
+                     response=STATUS)
+    self.expect_post(API_STATUSES, json={'status': 'baz'}, response=STATUS)
+    self.mox.ReplayAll()
+
+    # max_workers=1 so that the mocked requests arrive in order
+    results = self.mastodon.create_many(
+      [OBJECT, {'objectType': 'note', 'content': 'baz'}], max_workers=1)
+
+    self.assertEqual(2, len(results))
+    for result in results:
+      self.assert_equals(STATUS, result.content, result)
+      self.assertIsNone(result.error_plain)
+      self.assertIsNone(result.error_html)
+
+  def test_create_many_empty(self):
+    self.assertEqual([], self.mastodon.create_many([]))
+
   def test_create_bookmark(self):
     self.expect_post(API_STATUSES, json={'status': 'foo ☕ bar'},
                      response=STATUS)
@@ -743,6 +893,30 @@ class MastodonTest(testutil.TestCase):
       'inReplyTo': [bad, remote],
     }))
 
+  def test_base_object_cached(self):
+    remote = {'url': STATUS_REMOTE['uri']}
+
+    # just one search request; the second lookup is served from cache
+    self.expect_get(API_SEARCH, params={'q': STATUS_REMOTE['uri'],'resolve': True},
+                    response={'statuses': [STATUS_REMOTE]})
+    self.mox.ReplayAll()
+
+    expected = copy.deepcopy(OBJECT_REMOTE)
+    expected['id'] = STATUS_REMOTE['id']
+    self.assert_equals(expected, self.mastodon.base_object({'object': remote}))
+    self.assert_equals(expected, self.mastodon.base_object({'object': remote}))
+
+  def test_base_object_not_found_cached(self):
+    # just one search request; the failed lookup is cached
+    self.expect_get(API_SEARCH, params={'q': 'http://bad/456','resolve': True},
+                    status_code=404)
+    self.mox.ReplayAll()
+
+    for _ in range(2):
+      self.assert_equals({}, self.mastodon.base_object({
+        'object': {'url': 'http://bad/456'},
+      }))
+
   def test_embed_post(self):
     embed = self.mastodon.embed_post({'url': 'http://foo.com/bar'})
     self.assertIn('<script src="http://foo.com/embed.js"', embed)
@@ -915,6 +1089,18 @@ class MastodonTest(testutil.TestCase):
     result = self.mastodon.create(obj)
     self.assert_equals(STATUS, result.content, result)
 
+  def test_upload_media_rate_limited_no_retry(self):
+    self.expect_requests_get('http://foo.com/image.jpg', 'pic 1')
+    self.expect_post(API_MEDIA, files={'file': b'pic 1'}, data={},
+                     status_code=429)
+    self.mox.ReplayAll()
+
+    # the first attempt consumes the media stream, so a retry would upload an
+    # empty file; the 429 should surface immediately instead
+    with self.assertRaises(HTTPError) as e:
+      self.mastodon.upload_media([{'url': 'http://foo.com/image.jpg'}])
+    self.assert_equals(429, e.exception.response.status_code)
+
   def test_create_with_too_many_media(self):
     image_urls = [f'http://my/picture/{i}' for i in range(mastodon.MAX_MEDIA)]
     obj = {
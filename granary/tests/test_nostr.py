@@ -9,7 +9,15 @@ from oauth_dropins.webutil import testutil
 from websockets.exceptions import ConnectionClosedOK, ConnectionClosedError
 
 from .. import nostr
-from ..nostr import from_as1, id_for, id_to_uri, is_bech32, to_as1, uri_to_id
+from ..nostr import (
+  from_as1,
+  id_for,
+  id_for_many,
+  id_to_uri,
+  is_bech32,
+  to_as1,
+  uri_to_id,
+)
 
 NOW_TS = int(testutil.NOW.timestamp())
 NOW_ISO = testutil.NOW.replace(tzinfo=None).isoformat()
@@ -95,6 +103,17 @@ class NostrTest(testutil.TestCase):
         'content': 'My plain text',
     }))
 
+  def test_id_for_many(self):
+    event = {
+      'pubkey': 'fed987',
+      'created_at': NOW_TS,
+      'kind': 1,
+      'content': 'My plain text',
+    }
+    other = {**event, 'content': 'Other plain text'}
+    self.assertEqual([id_for(dict(event)), id_for(dict(other))],
+                     id_for_many([event, other]))
+
   def test_id_to_uri(self):
     self.assertEqual(URI, id_to_uri('npub', ID))
 